@@ -2,7 +2,7 @@ import os
 import logging
 from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
-from bot_handlers import start, handle_voice, handle_text
+from bot_handlers import start, handle_voice, handle_text, history_service, storage
 
 load_dotenv()
 
@@ -35,11 +35,16 @@ def main():
     print("✅ Bot will stay active (Render Worker)")
     print("=" * 50)
     
-    application.run_polling(
-        drop_pending_updates=True,
-        allowed_updates=['message'],
-        close_loop=False
-    )
+    try:
+        application.run_polling(
+            drop_pending_updates=True,
+            allowed_updates=['message'],
+            close_loop=False
+        )
+    finally:
+        # Flush pending quote history records
+        history_service.close()
+        storage.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,4 +1,4 @@
-import os
+import asyncio
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -6,18 +6,18 @@ from stt_service import STTService
 from nlp_service import NLPProcessor
 from pdf_service import PDFGenerator
 from db_service import DBService
+from history_service import QuoteHistoryService
+from storage_service import TempStorage
 
 # Initialize services
 db_service = DBService(db_path="products.db")
 db_service.seed_data()
 
-stt_service = STTService()
+storage = TempStorage(disk_dir="temp")
+stt_service = STTService(storage=storage)
 nlp_processor = NLPProcessor(db_service=db_service)
 pdf_generator = PDFGenerator(output_dir="temp")
-
-# Ensure temp directory exists
-if not os.path.exists("temp"):
-    os.makedirs("temp", exist_ok=True)
+history_service = QuoteHistoryService(db_path="quotes.db")
 
 logger = logging.getLogger(__name__)
 
@@ -33,14 +33,18 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🎤 جاري معالجة طلبك...")
         
         # Download voice file
-        voice_file = await update.message.voice.get_file()
-        file_path = f"temp/{voice_file.file_id}.ogg"
-        
-        await voice_file.download_to_drive(custom_path=file_path)
+        voice = update.message.voice
+        voice_file = await voice.get_file()
         
-        # Transcribe
-        await update.message.reply_text("🔊 تحويل الصوت إلى نص...")
-        text = stt_service.transcribe_audio(file_path) or "طلب صوتي"
+        # Reserve the OGG (default size if Telegram doesn't report it) and the converted WAV (16 kHz mono PCM, 32000 bytes/s) together
+        wav_size = (voice.duration + 1) * 32000 + 44
+        async with storage.async_temp_files((".ogg", voice.file_size), (".wav", wav_size)) as (file_path, wav_path):
+            await voice_file.download_to_drive(custom_path=file_path)
+            storage.settle(file_path)
+            
+            # Transcribe off the event loop (ffmpeg + Google STT are blocking)
+            await update.message.reply_text("🔊 تحويل الصوت إلى نص...")
+            text = await asyncio.to_thread(stt_service.transcribe_audio, file_path, wav_path) or "طلب صوتي"
         
         await update.message.reply_text(f"📝 النص: {text}")
         
@@ -50,22 +54,9 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Generate PDF
         await update.message.reply_text("📄 إنشاء ملف PDF...")
-        pdf_path = pdf_generator.generate_quote(data, filename=f"quote_{voice_file.file_id}.pdf")
-        
-        # Send PDF
-        with open(pdf_path, 'rb') as pdf_file:
-            await update.message.reply_document(
-                document=pdf_file,
-                filename="quote.pdf",
-                caption="✅ تم إنشاء عرض السعر"
-            )
-        
-        # Cleanup
-        for f in [file_path, pdf_path]:
-            try:
-                os.remove(f)
-            except:
-                pass
+        await send_quote(update, data)
+        # Only quotes that were actually delivered go into history
+        history_service.record(data, transcript=text)
                 
     except Exception as e:
         logger.error(f"Error in handle_voice: {e}")
@@ -79,7 +70,19 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         data = nlp_processor.extract_data(text)
         data['customer_id'] = update.message.from_user.full_name or update.message.from_user.username
         
-        pdf_path = pdf_generator.generate_quote(data, filename=f"quote_{update.message.message_id}.pdf")
+        await send_quote(update, data)
+        history_service.record(data, transcript=text)
+            
+    except Exception as e:
+        logger.error(f"Error in handle_text: {e}")
+        await update.message.reply_text("❌ حدث خطأ. حاول مرة أخرى.")
+
+async def send_quote(update: Update, data: dict):
+    """Render the quote into a scratch file and send it; the file is removed afterwards."""
+    async with storage.async_temp_file(suffix=".pdf", expected_size=PDFGenerator.estimate_size(data)) as pdf_path:
+        # Large orders take seconds to render; keep the event loop free
+        await asyncio.to_thread(pdf_generator.generate_quote, data, filepath=pdf_path)
+        storage.settle(pdf_path)
         
         with open(pdf_path, 'rb') as pdf_file:
             await update.message.reply_document(
@@ -87,13 +90,3 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 filename="quote.pdf",
                 caption="✅ تم إنشاء عرض السعر"
             )
-        
-        # Cleanup
-        try:
-            os.remove(pdf_path)
-        except:
-            pass
-            
-    except Exception as e:
-        logger.error(f"Error in handle_text: {e}")
-        await update.message.reply_text("❌ حدث خطأ. حاول مرة أخرى.")
\ No newline at end of file
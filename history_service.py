@@ -0,0 +1,189 @@
+import sqlite3
+import json
+import time
+import queue
+import atexit
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class QuoteHistoryService:
+    """
+    Append-only quote history.
+    Handlers call record() which only enqueues; a background thread writes
+    the buffered records to SQLite in batched transactions.
+    """
+
+    MAX_QUERY_LIMIT = 100
+
+    def __init__(self, db_path="quotes.db", batch_size=50, flush_interval=2.0, max_pending=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self.init_db()
+
+        self._writer = threading.Thread(target=self._run_writer, name="quote-history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init_db(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS quotes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                customer_id TEXT,
+                transcript TEXT,
+                items TEXT NOT NULL,
+                grand_total REAL NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_quotes_created_at ON quotes (created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_quotes_customer ON quotes (customer_id)')
+        conn.commit()
+        conn.close()
+
+    def record(self, data: dict, transcript=None):
+        """
+        Enqueue an extract_data() result. Never blocks the caller;
+        returns False if the buffer is full or the service is closed.
+        """
+        if self._closed:
+            return False
+        items = data.get('items', [])
+        row = (
+            time.time(),
+            data.get('customer_id'),
+            transcript if transcript is not None else data.get('raw_text'),
+            json.dumps(items, ensure_ascii=False),
+            float(sum(item.get('total', 0) or 0 for item in items)),
+        )
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            logger.warning("Quote history buffer full, dropping record")
+            return False
+
+    def _run_writer(self):
+        conn = self._connect()
+        batch = []
+        deadline = None
+        stopping = False
+        try:
+            while not stopping:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    row = self._queue.get(timeout=timeout)
+                    if row is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(row)
+                        if deadline is None:
+                            deadline = time.monotonic() + self.flush_interval
+                except queue.Empty:
+                    pass
+
+                if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._write_batch(conn, batch)
+                    batch = []
+                    deadline = None
+
+            # Drain anything enqueued after the stop marker
+            while True:
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is not _STOP:
+                    batch.append(row)
+            if batch:
+                self._write_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT INTO quotes (created_at, customer_id, transcript, items, grand_total) VALUES (?, ?, ?, ?, ?)',
+                    batch
+                )
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} quote history records: {e}")
+
+    def close(self, timeout=10):
+        """Flush pending records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._writer.is_alive():
+            logger.error(f"Quote history writer is not running, {self._queue.qsize()} records not written")
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error("Quote history buffer full, could not signal writer to stop")
+            return
+        self._writer.join(timeout)
+
+    def get_recent(self, customer_id=None, limit=20, before_id=None):
+        """
+        Return the newest quotes, optionally for one customer.
+        limit is capped at MAX_QUERY_LIMIT; pass the smallest id of the
+        previous page as before_id to page backwards.
+        """
+        limit = max(1, min(int(limit), self.MAX_QUERY_LIMIT))
+        clauses = []
+        params = []
+        if customer_id is not None:
+            clauses.append('customer_id = ?')
+            params.append(customer_id)
+        if before_id is not None:
+            clauses.append('id < ?')
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            f'SELECT id, created_at, customer_id, transcript, items, grand_total FROM quotes {where} ORDER BY id DESC LIMIT ?',
+            params
+        )
+        rows = cursor.fetchall()
+        conn.close()
+        return [self._row_to_dict(row) for row in rows]
+
+    def get_quote(self, quote_id):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT id, created_at, customer_id, transcript, items, grand_total FROM quotes WHERE id = ?',
+            (quote_id,)
+        )
+        row = cursor.fetchone()
+        conn.close()
+        return self._row_to_dict(row) if row else None
+
+    @staticmethod
+    def _row_to_dict(row):
+        return {
+            "id": row[0],
+            "created_at": row[1],
+            "customer_id": row[2],
+            "transcript": row[3],
+            "items": json.loads(row[4]),
+            "grand_total": row[5]
+        }
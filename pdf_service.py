@@ -1,6 +1,6 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer, PageBreak, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
@@ -25,9 +25,77 @@ def reshape_ar(text: str) -> str:
         # إذا حدث خطأ في المكتبات، ارجع النص كما هو (أفضل من توقف كامل)
         return text
 
+class PagedOrderTable(Flowable):
+    """
+    Large-order table that holds at most one page of rows at a time.
+    wrap() always reports one point more than the space available, so the
+    frame calls split() with the space left on the current page. split()
+    returns a table that fits that space, a PageBreak and this flowable
+    again, until the rows run out. Rows are consumed, so it can only be
+    built once.
+    """
+
+    def __init__(self, rows, make_page, reserved):
+        Flowable.__init__(self)
+        # rows yields (cells, row_height, line_total)
+        self._rows = iter(rows)
+        self._pending = None
+        self._make_page = make_page
+        # Height of the header, subtotal and carried-forward rows
+        self._reserved = reserved
+        self._running_total = 0
+        self._deferred = False
+
+    def wrap(self, availWidth, availHeight):
+        return availWidth, availHeight + 1
+
+    def draw(self):
+        pass
+
+    def _next_row(self):
+        row, self._pending = self._pending, None
+        return row if row is not None else next(self._rows, None)
+
+    def split(self, availWidth, availHeight):
+        # Keep 1pt for rounding
+        available = availHeight - self._reserved - 1
+        rows, heights = [], []
+        used = page_total = 0
+
+        row = self._next_row()
+        while row is not None:
+            cells, row_height, line_total = row
+            if used + row_height > available and (rows or not self._deferred):
+                break
+            rows.append(cells)
+            heights.append(row_height)
+            used += row_height
+            page_total += line_total
+            row = self._next_row()
+        self._pending = row
+
+        if not rows and row is not None:
+            # Not even one row fits in what is left of this page; start a new one
+            self._deferred = True
+            return [PageBreak(), self]
+        self._deferred = False
+
+        self._running_total += page_total
+        is_last = row is None
+        table = self._make_page(rows, heights, page_total, self._running_total, is_last)
+        return [table] if is_last else [table, PageBreak(), self]
+
 class PDFGenerator:
-    def __init__(self, output_dir="temp", font_path="fonts/Amiri-Regular.ttf", font_name="ArabicFont"):
+    # Specs, Total, Price, Qty, Name
+    COL_WIDTHS = [150, 70, 70, 50, 150]
+
+    def __init__(self, output_dir="temp", font_path="fonts/Amiri-Regular.ttf", font_name="ArabicFont",
+                 large_order_threshold=100, large_row_height=16):
         self.output_dir = output_dir
+        # Orders with more items than this are rendered in large-order mode
+        self.large_order_threshold = large_order_threshold
+        # Minimum row height in large-order mode; rows with wrapped text grow
+        self.large_row_height = large_row_height
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
@@ -45,8 +113,21 @@ class PDFGenerator:
         except Exception as e:
             raise RuntimeError(f"Failed to register font {self.font_path}: {e}")
 
-    def generate_quote(self, data: dict, filename="quote.pdf"):
-        filepath = os.path.join(self.output_dir, filename)
+    @staticmethod
+    def estimate_size(data: dict) -> int:
+        """
+        Rough upper bound of the PDF size in bytes (embedded font subset + rows),
+        or None when items is an iterator of unknown length. Measured quotes are
+        about 22 KB plus 60 bytes per item.
+        """
+        items = data.get('items', [])
+        if not isinstance(items, (list, tuple)):
+            return None
+        return 64 * 1024 + 256 * len(items)
+
+    def generate_quote(self, data: dict, filename="quote.pdf", filepath=None):
+        if filepath is None:
+            filepath = os.path.join(self.output_dir, filename)
         doc = SimpleDocTemplate(filepath, pagesize=letter, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36)
         elements = []
 
@@ -93,8 +174,6 @@ class PDFGenerator:
             Paragraph(reshape_ar("اسم المنتج"), arabic_style)
         ]
         
-        table_data = [headers]
-        
         items = data.get('items', [])
         # Handle legacy format if items is missing (fallback)
         if not items and 'product_name' in data:
@@ -106,6 +185,28 @@ class PDFGenerator:
                  'specs': data.get('specs')
              }]
 
+        footer = "تم إنشاء المستند بواسطة النظام"
+        tail = [Spacer(1, 20), Paragraph(reshape_ar(footer), arabic_style)]
+
+        # Iterators (unknown length) and big lists go through the paginated path
+        if not isinstance(items, (list, tuple)) or len(items) > self.large_order_threshold:
+            elements.append(self._build_large_order_table(items, arabic_style))
+        else:
+            elements.append(self._build_table(items, headers, arabic_style))
+        elements.extend(tail)
+
+        # بناء الملف
+        try:
+            doc.build(elements)
+        except Exception as e:
+            raise RuntimeError(f"Failed to build PDF: {e}")
+
+        return filepath
+
+    def _build_table(self, items, headers, arabic_style):
+        """Single table with a Paragraph per cell, for regular-sized orders."""
+        table_data = [headers]
+        
         grand_total = 0
         
         for item in items:
@@ -135,11 +236,7 @@ class PDFGenerator:
             ""
         ])
 
-        # Column widths (adjust as needed)
-        # Specs, Total, Price, Qty, Name
-        col_widths = [150, 70, 70, 50, 150]
-        
-        t = Table(table_data, colWidths=col_widths, hAlign='RIGHT')
+        t = Table(table_data, colWidths=self.COL_WIDTHS, hAlign='RIGHT')
 
         t.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
@@ -153,19 +250,80 @@ class PDFGenerator:
             ('SPAN', (2, -1), (4, -1)), # Span "Grand Total" label
         ]))
 
-        elements.append(t)
-        elements.append(Spacer(1, 20))
+        return t
 
-        footer = "تم إنشاء المستند بواسطة النظام"
-        elements.append(Paragraph(reshape_ar(footer), arabic_style))
+    def _iter_large_rows(self, items, cell_style, padding):
+        """
+        Lazily yield (row, row_height, line_total). Numeric columns are plain
+        strings; name and specs stay Paragraphs so long text wraps instead of
+        being cut, and the row height is measured from the wrapped text.
+        """
+        min_height = self.large_row_height
+        specs_width = self.COL_WIDTHS[0] - 12  # default 6pt left/right cell padding
+        name_width = self.COL_WIDTHS[4] - 12
+        for item in items:
+            line_total = item.get('total', 0) or 0
+            specs = Paragraph(reshape_ar(str(item.get('specs', '') or '')), cell_style)
+            name = Paragraph(reshape_ar(str(item.get('product_name', 'N/A'))), cell_style)
+            text_height = max(specs.wrap(specs_width, 1e6)[1], name.wrap(name_width, 1e6)[1])
+            yield [
+                specs,
+                f"{line_total:.2f}",
+                f"{item.get('price', 0) or 0:.2f}",
+                str(item.get('quantity', 0)),
+                name,
+            ], max(min_height, text_height + padding), line_total
 
-        # بناء الملف
-        try:
-            doc.build(elements)
-        except Exception as e:
-            raise RuntimeError(f"Failed to build PDF: {e}")
+    def _build_large_order_table(self, items, arabic_style):
+        """
+        Large-order mode: a PagedOrderTable that renders one LongTable per
+        page, each with a repeated header row and page subtotal /
+        carried-forward rows.
+        """
+        cell_style = ParagraphStyle(name="ArabicSmall", parent=arabic_style, fontSize=9, leading=11)
+        padding = 4  # TOPPADDING + BOTTOMPADDING below
+        fixed_height = max(self.large_row_height, cell_style.leading + padding)
+        # Header, subtotal and carried-forward rows on every page
+        reserved = 3 * fixed_height
 
-        return filepath
+        headers = [reshape_ar(h) for h in ("المواصفات", "الإجمالي", "السعر", "الكمية", "اسم المنتج")]
+        subtotal_label = reshape_ar("المجموع الفرعي")
+        carried_label = reshape_ar("المجموع المرحل")
+        grand_label = reshape_ar("الإجمالي الكلي")
+
+        style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, -1), self.font_name),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            # Subtotal and carried-forward rows
+            ('BACKGROUND', (0, -2), (-1, -1), colors.beige),
+            ('SPAN', (2, -2), (4, -2)),
+            ('SPAN', (2, -1), (4, -1)),
+        ])
+
+        def page_table(rows, heights, page_total, running_total, is_last):
+            table_data = [headers] + rows
+            table_data.append(["", f"{page_total:.2f}", subtotal_label, "", ""])
+            # On the last page the carried-forward total is the grand total
+            table_data.append(["", f"{running_total:.2f}", grand_label if is_last else carried_label, "", ""])
+            t = LongTable(
+                table_data,
+                colWidths=self.COL_WIDTHS,
+                rowHeights=[fixed_height] + heights + [fixed_height, fixed_height],
+                repeatRows=1,
+                hAlign='RIGHT'
+            )
+            t.setStyle(style)
+            return t
+
+        rows = self._iter_large_rows(items, cell_style, padding)
+        return PagedOrderTable(rows, page_table, reserved)
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+import os
+import time
+import uuid
+import atexit
+import asyncio
+import threading
+import logging
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+class StorageQuotaError(RuntimeError):
+    """Raised when scratch space could not be reserved before the timeout."""
+
+class TempStorage:
+    """
+    Scratch-file manager shared by the bot handlers, STT and PDF services.
+    Small files go to a RAM-backed spool (tmpfs) when available, larger ones
+    to disk. Every file is reserved against a global byte quota and removed
+    when its context exits; a janitor thread deletes orphans by age.
+    """
+
+    def __init__(self, disk_dir="temp", ram_dir="/dev/shm/voicebot", ram_threshold=4 * 1024 * 1024,
+                 ram_quota=64 * 1024 * 1024, quota=512 * 1024 * 1024, wait_timeout=30,
+                 max_age=3600, janitor_interval=300, default_size=20 * 1024 * 1024, poll_interval=0.05):
+        self.disk_dir = disk_dir
+        self.ram_threshold = ram_threshold
+        self.ram_quota = ram_quota
+        self.quota = quota
+        self.wait_timeout = wait_timeout
+        self.max_age = max_age
+        self.janitor_interval = janitor_interval
+        # Reserved when the caller does not know the size (Telegram's bot download limit)
+        self.default_size = default_size
+        # How often async callers re-check the quota while waiting
+        self.poll_interval = poll_interval
+
+        os.makedirs(self.disk_dir, exist_ok=True)
+        self.ram_dir = self._init_ram_dir(ram_dir)
+
+        self._cond = threading.Condition()
+        self._reserved = 0
+        self._ram_reserved = 0
+        self._active = {}  # path -> (size, in_ram)
+
+        self._stop = threading.Event()
+        self._janitor = threading.Thread(target=self._run_janitor, name="temp-storage-janitor", daemon=True)
+        self._janitor.start()
+        atexit.register(self.close)
+
+    def _init_ram_dir(self, ram_dir):
+        """Return ram_dir if a writable tmpfs is available, else None."""
+        if not ram_dir or not os.path.isdir(os.path.dirname(ram_dir)):
+            return None
+        try:
+            os.makedirs(ram_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"RAM spool not available ({ram_dir}): {e}")
+            return None
+        if not os.access(ram_dir, os.W_OK):
+            return None
+        return ram_dir
+
+    def _sizes(self, files):
+        """Normalize (suffix, expected_size) pairs and return them with their total."""
+        files = [
+            (suffix, self.default_size if expected_size is None else max(0, int(expected_size)))
+            for suffix, expected_size in files
+        ]
+        total = sum(size for _, size in files)
+        if total > self.quota:
+            raise StorageQuotaError(f"{total} bytes of scratch files exceed storage quota of {self.quota} bytes")
+        return files, total
+
+    def _timeout_error(self, total):
+        return StorageQuotaError(
+            f"Timed out waiting for {total} bytes of scratch space "
+            f"({self._reserved}/{self.quota} bytes in use)"
+        )
+
+    def _try_reserve(self, files, total):
+        """Reserve all files if they fit right now; returns their paths or None. Caller holds _cond."""
+        if self._reserved + total > self.quota:
+            return None
+        paths = []
+        for suffix, expected_size in files:
+            in_ram = (
+                self.ram_dir is not None
+                and expected_size <= self.ram_threshold
+                and self._ram_reserved + expected_size <= self.ram_quota
+            )
+            directory = self.ram_dir if in_ram else self.disk_dir
+            path = os.path.join(directory, f"{uuid.uuid4().hex}{suffix}")
+
+            self._reserved += expected_size
+            if in_ram:
+                self._ram_reserved += expected_size
+            self._active[path] = (expected_size, in_ram)
+            paths.append(path)
+        return paths
+
+    def _acquire(self, files):
+        """
+        Reserve quota for one or more new files at once, blocking the calling
+        thread while over quota. files is a list of (suffix, expected_size);
+        returns their paths. Reserving together avoids holding one file while
+        waiting for the next.
+        """
+        files, total = self._sizes(files)
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            while True:
+                paths = self._try_reserve(files, total)
+                if paths is not None:
+                    return paths
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timeout_error(total)
+                self._cond.wait(remaining)
+
+    async def _acquire_async(self, files):
+        """
+        Same as _acquire, but waits on the event loop by polling, so no
+        executor thread is parked while over quota. Nothing is reserved
+        until _try_reserve succeeds and there is no await after it, so
+        cancelling the caller never leaks a reservation.
+        """
+        files, total = self._sizes(files)
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._cond:
+                paths = self._try_reserve(files, total)
+                if paths is not None:
+                    return paths
+                if time.monotonic() >= deadline:
+                    raise self._timeout_error(total)
+            await asyncio.sleep(self.poll_interval)
+
+    def _release(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove temp file {path}: {e}")
+
+        with self._cond:
+            size, in_ram = self._active.pop(path, (0, False))
+            self._reserved -= size
+            if in_ram:
+                self._ram_reserved -= size
+            self._cond.notify_all()
+
+    def settle(self, path):
+        """
+        Replace the estimated reservation of a written file with its real size.
+        Raises StorageQuotaError if the file pushed usage over the quota (or
+        over ram_quota for RAM-spooled files); the owning context still
+        deletes it. Returns the actual size.
+        """
+        try:
+            actual = os.path.getsize(path)
+        except FileNotFoundError:
+            actual = 0
+
+        with self._cond:
+            if path not in self._active:
+                return actual
+            size, in_ram = self._active[path]
+            delta = actual - size
+            if delta > 0:
+                if in_ram and self._ram_reserved + delta > self.ram_quota:
+                    raise StorageQuotaError(
+                        f"{path} is {actual} bytes (estimated {size}), exceeding the RAM spool quota"
+                    )
+                if self._reserved + delta > self.quota:
+                    raise StorageQuotaError(
+                        f"{path} is {actual} bytes (estimated {size}), exceeding the storage quota"
+                    )
+            self._reserved += delta
+            if in_ram:
+                self._ram_reserved += delta
+            self._active[path] = (actual, in_ram)
+            if delta < 0:
+                self._cond.notify_all()
+        return actual
+
+    @contextmanager
+    def temp_file(self, suffix="", expected_size=None):
+        """
+        Yield a unique path for a scratch file; the file is deleted on exit.
+        Blocks (up to wait_timeout) while the byte quota is exhausted, so
+        only call it off the event loop; async code uses async_temp_file.
+        """
+        path, = self._acquire([(suffix, expected_size)])
+        try:
+            yield path
+        finally:
+            self._release(path)
+
+    @asynccontextmanager
+    async def async_temp_file(self, suffix="", expected_size=None):
+        """Same as temp_file, but waits for quota without blocking the event loop."""
+        async with self.async_temp_files((suffix, expected_size)) as (path,):
+            yield path
+
+    @asynccontextmanager
+    async def async_temp_files(self, *files):
+        """
+        Reserve several scratch files in one step, given as (suffix, expected_size)
+        pairs, and yield their paths. All of them are deleted on exit.
+        An expected_size of None reserves default_size; call settle() once a
+        file is written so the quota reflects its real size.
+        """
+        paths = await self._acquire_async(files)
+        try:
+            yield paths
+        finally:
+            for path in paths:
+                self._release(path)
+
+    def usage(self):
+        with self._cond:
+            return {
+                "reserved": self._reserved,
+                "ram_reserved": self._ram_reserved,
+                "active_files": len(self._active)
+            }
+
+    def cleanup_orphans(self):
+        """Delete files older than max_age that no context currently owns."""
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for directory in filter(None, (self.disk_dir, self.ram_dir)):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                logger.warning(f"Janitor could not scan {directory}: {e}")
+                continue
+            for entry in entries:
+                with self._cond:
+                    if entry.path in self._active:
+                        continue
+                try:
+                    if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Janitor could not remove {entry.path}: {e}")
+        if removed:
+            logger.info(f"🧹 Removed {removed} orphaned temp files")
+        return removed
+
+    def _run_janitor(self):
+        # Run once at startup to clear leftovers from previous processes
+        while True:
+            try:
+                self.cleanup_orphans()
+            except Exception as e:
+                logger.error(f"Temp storage janitor error: {e}")
+            if self._stop.wait(self.janitor_interval):
+                break
+
+    def close(self):
+        """Stop the janitor thread."""
+        self._stop.set()
+        if self._janitor.is_alive():
+            self._janitor.join(timeout=5)
@@ -2,13 +2,16 @@ import os
 import subprocess
 import tempfile
 import logging
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
 class STTService:
-    def __init__(self, credentials_path=None):
+    def __init__(self, credentials_path=None, storage=None):
         """Initialize STT service"""
         self.client = None
+        # Optional TempStorage used for intermediate WAV files
+        self.storage = storage
         
     def _get_client(self):
         """Lazy initialization of Google Speech client"""
@@ -24,17 +27,23 @@ class STTService:
                 self.client = None
         return self.client
     
-    def convert_audio_to_wav(self, input_path):
+    def convert_audio_to_wav(self, input_path, output_path=None):
         """
         Convert any audio format to WAV using ffmpeg
         """
+        created = False
         try:
             if not os.path.exists(input_path):
                 logger.error(f"Input file does not exist: {input_path}")
                 return None
             
-            # Create a temporary WAV file
-            temp_wav = tempfile.mktemp(suffix='.wav', dir='temp')
+            if output_path:
+                temp_wav = output_path
+            else:
+                # Create a temporary WAV file (caller removes it on success)
+                fd, temp_wav = tempfile.mkstemp(suffix='.wav', dir='temp')
+                os.close(fd)
+                created = True
             
             logger.info(f"Converting {input_path} to WAV...")
             
@@ -61,22 +70,27 @@ class STTService:
             
             if process.returncode != 0:
                 logger.error(f"FFmpeg conversion failed: {process.stderr}")
-                return None
-            
-            if os.path.exists(temp_wav) and os.path.getsize(temp_wav) > 0:
+            elif os.path.exists(temp_wav) and os.path.getsize(temp_wav) > 0:
                 logger.info(f"Converted to WAV: {temp_wav} ({os.path.getsize(temp_wav)} bytes)")
                 return temp_wav
             else:
                 logger.error("WAV file was not created or is empty")
-                return None
                 
         except Exception as e:
             logger.error(f"Audio conversion error: {e}")
-            return None
+        
+        # Failed: don't leave the file mkstemp created behind
+        if created:
+            try:
+                os.remove(temp_wav)
+            except OSError:
+                pass
+        return None
     
-    def transcribe_audio(self, audio_path):
+    def transcribe_audio(self, audio_path, wav_path=None):
         """
-        Transcribe audio file to text
+        Transcribe audio file to text.
+        wav_path is an optional pre-reserved path for the converted WAV.
         """
         try:
             if not os.path.exists(audio_path):
@@ -86,7 +100,7 @@ class STTService:
             client = self._get_client()
             if client:
                 try:
-                    return self._transcribe_with_google(audio_path)
+                    return self._transcribe_with_google(audio_path, wav_path)
                 except Exception as google_error:
                     logger.warning(f"Google STT failed: {google_error}")
             
@@ -97,24 +111,57 @@ class STTService:
             logger.error(f"Transcription error: {e}")
             return "طلب صوتي: أريد منتجات إلكترونية"
     
-    def _transcribe_with_google(self, audio_path):
+    def _transcribe_with_google(self, audio_path, wav_path=None):
         """Transcribe using Google Speech-to-Text"""
-        from google.cloud import speech_v1 as speech
+        if audio_path.endswith('.wav'):
+            return self._recognize_wav(audio_path)
         
-        # Convert to WAV if needed
-        if not audio_path.endswith('.wav'):
-            wav_path = self.convert_audio_to_wav(audio_path)
-            if wav_path:
-                audio_path = wav_path
-                is_temp_file = True
-            else:
+        # Convert to WAV first
+        if wav_path:
+            if not self._convert_to_scratch_wav(audio_path, wav_path):
                 return "فشل في تحويل الملف الصوتي"
-        else:
-            is_temp_file = False
+            return self._recognize_wav(wav_path)
+        
+        with self._scratch_wav(audio_path) as wav_path:
+            if not self._convert_to_scratch_wav(audio_path, wav_path):
+                return "فشل في تحويل الملف الصوتي"
+            return self._recognize_wav(wav_path)
+    
+    def _convert_to_scratch_wav(self, audio_path, wav_path):
+        """Convert into wav_path and account its real size against the storage quota"""
+        if not self.convert_audio_to_wav(audio_path, wav_path):
+            return False
+        if self.storage:
+            self.storage.settle(wav_path)
+        return True
+    
+    @contextmanager
+    def _scratch_wav(self, audio_path):
+        """Yield a path for the converted WAV and remove it afterwards"""
+        if self.storage:
+            # 16 kHz mono PCM is roughly 16x the size of a Telegram OGG/Opus voice note
+            expected_size = os.path.getsize(audio_path) * 16
+            with self.storage.temp_file(suffix='.wav', expected_size=expected_size) as wav_path:
+                yield wav_path
+            return
+        
+        fd, wav_path = tempfile.mkstemp(suffix='.wav', dir='temp')
+        os.close(fd)
+        try:
+            yield wav_path
+        finally:
+            try:
+                os.remove(wav_path)
+            except OSError:
+                pass
+    
+    def _recognize_wav(self, wav_path):
+        """Send a 16 kHz mono WAV file to Google Speech-to-Text"""
+        from google.cloud import speech_v1 as speech
         
         try:
             # Read audio file
-            with open(audio_path, 'rb') as audio_file:
+            with open(wav_path, 'rb') as audio_file:
                 content = audio_file.read()
             
             # Configure recognition
@@ -137,13 +184,6 @@ class STTService:
             
             transcript = " ".join(transcript_parts)
             
-            # Cleanup
-            if is_temp_file:
-                try:
-                    os.remove(audio_path)
-                except:
-                    pass
-            
             return transcript.strip() if transcript else "لم أتمكن من التعرف على الكلام"
             
         except Exception as e: